@@ -0,0 +1,82 @@
+# Canned responses used when Ollama is unavailable, keyed by a word the
+# prompt must contain. Checked in order.
+MOCK_EXPLAIN_RESPONSE = """SIMPLE EXPLANATION:
+This concept helps organize information and solve problems systematically.
+
+STEPS:
+1. Understand the basic definition
+2. Learn the key components
+3. Practice with examples
+4. Apply in real situations
+
+ANALOGY:
+Like learning to cook - start with ingredients, follow recipes, then create your own dishes.
+
+KEY POINTS:
+- Focus on core principles
+- Practice regularly
+- Connect to real-world applications"""
+
+MOCK_SUMMARY_RESPONSE = """SUMMARY:
+The content covers essential concepts with practical applications for effective learning.
+
+KEY POINTS:
+- Core concepts are explained clearly
+- Examples help understanding
+- Practice exercises reinforce learning
+
+DEFINITIONS:
+Concept: A fundamental idea or principle
+Application: How concepts are used in practice
+
+EXAM TIPS:
+- Review key definitions
+- Practice with examples
+- Understand concepts rather than memorize"""
+
+MOCK_QUIZ_RESPONSE = """[
+  {
+    "question": "What is the main purpose of studying this concept?",
+    "type": "mcq",
+    "options": ["To memorize facts", "To develop problem-solving skills", "To pass exams only", "To complicate simple ideas"],
+    "answer": "To develop problem-solving skills",
+    "explanation": "The concept helps build critical thinking and problem-solving abilities."
+  },
+  {
+    "question": "True or False: This concept has practical applications.",
+    "type": "truefalse",
+    "answer": "True",
+    "explanation": "The concept can be applied to solve real-world problems."
+  }
+]"""
+
+MOCK_FLASHCARDS_RESPONSE = """[
+  {
+    "question": "What is the definition of the core concept?",
+    "answer": "A fundamental idea that forms the basis for understanding a subject."
+  },
+  {
+    "question": "Name one application of this concept.",
+    "answer": "It can be used to solve problems systematically."
+  }
+]"""
+
+MOCK_DEFAULT_RESPONSE = """Response from {model}:
+
+I understand you're looking for information on this topic. Here are key insights:
+
+1. **Main Idea**: The concept revolves around understanding fundamental principles
+2. **Applications**: Can be used in various practical scenarios
+3. **Importance**: Provides foundation for advanced learning
+
+For best results with Phi-3 Mini:
+- Keep questions specific and concise
+- Focus on one concept at a time
+- Use clear, simple language"""
+
+MOCK_RESPONSES = (
+    ("explain", MOCK_EXPLAIN_RESPONSE),
+    ("summarize", MOCK_SUMMARY_RESPONSE),
+    ("quiz", MOCK_QUIZ_RESPONSE),
+    ("flashcard", MOCK_FLASHCARDS_RESPONSE),
+)
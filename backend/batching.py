@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+
+class RequestBatcher:
+    """Collect concurrent requests for a short window and hand them over together.
+
+    Callers await submit(); a background collector groups whatever arrives
+    within max_wait seconds (or up to max_batch items) and passes the payloads
+    to handler, which returns one result - or exception - per payload.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 8,
+        max_wait: float = 0.02,
+    ):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        # Keep references to in-flight batches so they are not garbage collected
+        self._running: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the collector on the running event loop."""
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self) -> None:
+        """Cancel the collector and any batches still in flight."""
+        tasks = list(self._running)
+        if self._collector is not None:
+            tasks.append(self._collector)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._collector = None
+
+    async def submit(self, payload: Any) -> Any:
+        """Queue a payload and wait for its result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Don't wait for the batch here, or a slow generation would hold up the next one
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.handler([payload for payload, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # Caller went away (e.g. client disconnected)
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,121 +1,316 @@
-import requests
-import json
-from typing import List, Dict, Any
-import time
+import asyncio
+import httpx
+import hashlib
+import logging
+import orjson
+import os
 import re
+import time
+from collections import OrderedDict
+import numpy as np
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from _mock_templates import MOCK_DEFAULT_RESPONSE, MOCK_RESPONSES
+from batching import RequestBatcher
+from semantic_cache import SemanticCache
+
+logger = logging.getLogger("concepta")
+
+# Request bodies are encoded with orjson rather than httpx's stdlib json
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# The still-escaped "response" string in an Ollama /api/generate body
+RESPONSE_FIELD_RE = re.compile(rb'"response"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+def extract_response_field(body: bytes) -> str:
+    """Pull the "response" value out of a generate body without decoding the rest.
+
+    The body also carries the token context array, which is usually larger
+    than the text itself.
+    """
+    match = RESPONSE_FIELD_RE.search(body)
+    if match is None:
+        return orjson.loads(body).get("response", "")
+    return orjson.loads(b'"' + match.group(1) + b'"')
 
 class LLMService:
     def __init__(self, base_url: str = "http://localhost:11434"):
         self.base_url = base_url
-        self.available_models = ["phi3:mini", "llama3.1:8b", "mistral:7b"]
-        
-    def get_available_models(self) -> List[str]:
-        """Get list of available models from Ollama."""
+        # One pooled client for all Ollama calls so requests don't block the event loop.
+        # Up to 10 idle connections are kept alive for reuse; bursts beyond that
+        # open extra connections rather than queueing.
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=60,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=10)
+        )
+        # Concurrent generations are collected for 20ms and sent to Ollama together
+        self.batcher = RequestBatcher(self._generate_batch, max_batch=8, max_wait=0.02)
+        self.available_models = ["phi3:mini", "llama3.2:3b", "mistral:7b", "llama3.1:8b"]
+        # Health and model-list polls are answered from memory for a short while
+        self.status_ttl = 5
+        self.tags_ttl = 30
+        self._status_cache: Optional[Tuple[float, bool]] = None
+        self._tags_cache: Optional[Tuple[float, List[str]]] = None
+        # Seconds to wait before a mock response, e.g. MOCK_DELAY=0.5 for UI testing
+        self.mock_delay = float(os.environ.get("MOCK_DELAY", 0))
+        # Optimize for Phi-3
+        self.options = {
+            "temperature": 0.3,
+            "top_p": 0.95,
+            "top_k": 40,
+            "num_predict": 1024
+        }
+        # Exact-match response cache: key -> (timestamp, response)
+        self.cache_size = 1024
+        self.cache_ttl = 24 * 60 * 60
+        self._response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Near-duplicate user inputs are matched by embedding similarity
+        self.semantic_cache = SemanticCache(base_url=base_url, client=self.client)
+    
+    def _cache_key(self, prompt: str, model: str, options: Dict[str, Any]) -> str:
+        """Hash model, normalized prompt and options into a cache key."""
+        normalized = " ".join(prompt.lower().split())
+        payload = f"{model}|{normalized}|".encode() + orjson.dumps(options, option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha256(payload).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Return a cached response, dropping it if it has expired."""
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        timestamp, response_text = entry
+        if time.time() - timestamp > self.cache_ttl:
+            del self._response_cache[key]
+            return None
+        self._response_cache.move_to_end(key)
+        return response_text
+    
+    def _cache_put(self, key: str, response_text: str) -> None:
+        """Store a response, evicting the least recently used entry when full."""
+        self._response_cache[key] = (time.time(), response_text)
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self.cache_size:
+            self._response_cache.popitem(last=False)
+    
+    def clear_cache(self) -> None:
+        """Drop all cached responses."""
+        self._response_cache.clear()
+        self.semantic_cache.clear()
+    
+    async def check_ollama(self) -> bool:
+        """Check if Ollama is running, reusing the answer for a few seconds."""
+        if self._status_cache and time.monotonic() - self._status_cache[0] < self.status_ttl:
+            return self._status_cache[1]
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models_data = response.json()
-                return [model["name"] for model in models_data.get("models", [])]
+            # The root endpoint answers without listing models
+            response = await self.client.get("/", timeout=3)
+            running = response.status_code == 200
         except:
-            pass
+            running = False
+        self._status_cache = (time.monotonic(), running)
+        return running
+    
+    async def get_available_models(self) -> List[str]:
+        """Get list of available models from Ollama, cached briefly."""
+        if self._tags_cache and time.monotonic() - self._tags_cache[0] < self.tags_ttl:
+            return self._tags_cache[1]
+        try:
+            response = await self.client.get("/api/tags", timeout=5)
+            if response.status_code == 200:
+                models_data = orjson.loads(response.content)
+                installed = [model["name"] for model in models_data.get("models", [])]
+                models = installed if installed else self.available_models
+                self._tags_cache = (time.monotonic(), models)
+                return models
+        except Exception as e:
+            logger.warning("Ollama connection error: %s", e)
         return self.available_models
     
-    def generate_response(self, prompt: str, model: str = "phi3:mini") -> str:
-        """Generate a response from Ollama."""
+    async def _lookup_cache(
+        self,
+        cache_key: str,
+        scope: str,
+        semantic_key: Optional[str]
+    ) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Check the exact and semantic caches.
+
+        Returns the cached response, if any, and the embedding of semantic_key
+        so a fresh response can be stored under it.
+        """
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            logger.debug("⚡ Cache hit")
+            return cached, None
         
-        # For testing without Ollama
-        print(f"Generating response with {model}...")
+        if not semantic_key:
+            return None, None
+        vector = await self.semantic_cache.embed_one(semantic_key)
+        if vector is None:
+            return None, None
+        cached = self.semantic_cache.check(vector, scope)
+        if cached is not None:
+            logger.debug("⚡ Semantic cache hit")
+            self._cache_put(cache_key, cached)
+        return cached, vector
+    
+    async def _remember(
+        self,
+        cache_key: str,
+        response_text: str,
+        semantic_key: Optional[str],
+        vector: Optional[np.ndarray],
+        scope: str
+    ) -> None:
+        """Store a fresh Ollama response in both caches."""
+        if not response_text:
+            # An empty reply (e.g. an aborted stream) must not be served for a day
+            return
+        self._cache_put(cache_key, response_text)
+        if vector is not None:
+            await self.semantic_cache.store(semantic_key, response_text, vector, scope)
+    
+    async def _generate_batch(self, payloads: List[Dict[str, Any]]) -> List[Any]:
+        """Send a batch of generation requests concurrently.
+
+        Ollama takes one prompt per request, so the batch is issued as parallel
+        requests for its scheduler to run together.
+        """
+        return await asyncio.gather(
+            *(
+                self.client.post("/api/generate", content=orjson.dumps(payload), headers=JSON_HEADERS)
+                for payload in payloads
+            ),
+            return_exceptions=True
+        )
+    
+    async def generate_response(
+        self,
+        prompt: str,
+        model: str = "phi3:mini",
+        semantic_key: Optional[str] = None,
+        semantic_scope: str = "",
+        system: str = ""
+    ) -> str:
+        """Generate response from Ollama with fallback.
+
+        system carries fixed instructions so Ollama can reuse their KV cache
+        across requests. When semantic_key is given, it is embedded and
+        compared against earlier requests with the same model and semantic_scope.
+        """
+        logger.debug("📤 Sending to %s: %.100s...", model, prompt)
+        
+        cache_key = self._cache_key(f"{system}\n{prompt}", model, self.options)
+        scope = f"{model}|{semantic_scope}"
+        cached, vector = await self._lookup_cache(cache_key, scope, semantic_key)
+        if cached is not None:
+            return cached
         
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "top_p": 0.95,
-                        "top_k": 40,
-                        "num_predict": 2048
-                    }
-                },
-                timeout=120
-            )
+            response = await self.batcher.submit({
+                "model": model,
+                "system": system,
+                "prompt": prompt,
+                "stream": False,
+                "options": self.options
+            })
             
             if response.status_code == 200:
-                result = response.json()
-                return result.get("response", "")
+                response_text = extract_response_field(response.content).strip()
+                logger.debug("✅ Received %d chars", len(response_text))
+                await self._remember(cache_key, response_text, semantic_key, vector, scope)
+                return response_text
             else:
-                print(f"Ollama error: {response.status_code}")
-                return self._generate_mock_response(prompt, model)
+                logger.warning("❌ Ollama error %s", response.status_code)
+                return await self._generate_mock_response(prompt, model, system)
                 
-        except requests.exceptions.RequestException as e:
-            print(f"Ollama connection failed: {e}")
-            return self._generate_mock_response(prompt, model)
+        except httpx.HTTPError as e:
+            logger.warning("❌ Connection failed: %s", e)
+            return await self._generate_mock_response(prompt, model, system)
+        except Exception as e:
+            logger.exception("❌ Unexpected error: %s", e)
+            return await self._generate_mock_response(prompt, model, system)
     
-    def _generate_mock_response(self, prompt: str, model: str) -> str:
-        """Generate a mock response for testing."""
-        time.sleep(1)  # Simulate processing
-        
-        if "explain" in prompt.lower():
-            return """SIMPLE EXPLANATION:
-This is a demonstration from Phi-3 Mini model.
-
-STEPS:
-1. Start with basic understanding
-2. Learn key components
-3. Practice application
-4. Review and improve
+    async def generate_stream(
+        self,
+        prompt: str,
+        model: str = "phi3:mini",
+        semantic_key: Optional[str] = None,
+        semantic_scope: str = "",
+        system: str = ""
+    ) -> AsyncIterator[str]:
+        """Yield response tokens from Ollama as they are generated.
 
-ANALOGY:
-Like learning a new language - start with vocabulary, then grammar, then conversation.
-
-KEY POINTS:
-- Foundation is important
-- Practice leads to mastery
-- Real-world application matters"""
+        Cache hits and the mock fallback are yielded as a single chunk.
+        """
+        logger.debug("📤 Streaming from %s: %.100s...", model, prompt)
         
-        elif "summarize" in prompt.lower():
-            return """SUMMARY:
-A concise overview of the main points.
-
-KEY POINTS:
-- Main idea one
-- Important concept two
-- Key detail three
-
-DEFINITIONS:
-Key Term: Important definition
-Core Concept: Fundamental idea
-
-EXAM TIPS:
-- Review key terms
-- Practice with examples
-- Understand concepts deeply"""
+        cache_key = self._cache_key(f"{system}\n{prompt}", model, self.options)
+        scope = f"{model}|{semantic_scope}"
+        cached, vector = await self._lookup_cache(cache_key, scope, semantic_key)
+        if cached is not None:
+            yield cached
+            return
         
-        elif "quiz" in prompt.lower():
-            return """[
-  {
-    "question": "What is the primary focus?",
-    "type": "mcq",
-    "options": ["Memory", "Understanding", "Speed", "Complexity"],
-    "answer": "Understanding",
-    "explanation": "True learning comes from understanding concepts."
-  }
-]"""
+        parts = []
+        try:
+            async with self.client.stream(
+                "POST",
+                "/api/generate",
+                content=orjson.dumps({
+                    "model": model,
+                    "system": system,
+                    "prompt": prompt,
+                    "stream": True,
+                    "options": self.options
+                }),
+                headers=JSON_HEADERS
+            ) as response:
+                if response.status_code != 200:
+                    logger.warning("❌ Ollama error %s", response.status_code)
+                    yield await self._generate_mock_response(prompt, model, system)
+                    return
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = orjson.loads(line)
+                    token = chunk.get("response", "")
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        break
+                    
+        except httpx.HTTPError as e:
+            logger.warning("❌ Connection failed: %s", e)
+            # Only fall back if nothing was sent yet - a partial answer stands
+            if not parts:
+                yield await self._generate_mock_response(prompt, model, system)
+            return
         
-        elif "flashcard" in prompt.lower():
-            return """[
-  {
-    "question": "What does this concept involve?",
-    "answer": "It involves understanding fundamental principles."
-  },
-  {
-    "question": "Why is practice important?",
-    "answer": "Practice reinforces learning and builds skill."
-  }
-]"""
+        response_text = "".join(parts).strip()
+        logger.debug("✅ Streamed %d chars", len(response_text))
+        await self._remember(cache_key, response_text, semantic_key, vector, scope)
+    
+    def start(self) -> None:
+        """Start the background batch collectors."""
+        self.batcher.start()
+        self.semantic_cache.batcher.start()
+    
+    async def aclose(self) -> None:
+        """Stop batching and close the pooled Ollama connections."""
+        await self.batcher.stop()
+        await self.semantic_cache.aclose()
+        await self.client.aclose()
+    
+    async def _generate_mock_response(self, prompt: str, model: str, system: str = "") -> str:
+        """Generate mock responses for testing."""
+        if self.mock_delay:
+            # Opt-in simulated latency that doesn't block other requests
+            await asyncio.sleep(self.mock_delay)
         
-        else:
-            return f"Response from {model}: I understand you're asking about this topic. The key points are understanding fundamentals, regular practice, and practical application."
\ No newline at end of file
+        text = f"{system}\n{prompt}".lower()
+        for keyword, response_text in MOCK_RESPONSES:
+            if keyword in text:
+                return response_text
+        return MOCK_DEFAULT_RESPONSE.format(model=model)
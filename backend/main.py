@@ -1,17 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Callable, Mapping, Optional
 import uvicorn
-import requests
-import json
+import logging
+import orjson
+import os
+import sys
 import re
-import time
+from llm_service import LLMService
+
+# Per-request details are logged at DEBUG and stay hidden; startup status
+# and problems are shown. The logger needs its own handler because uvicorn
+# only configures its own loggers.
+logger = logging.getLogger("concepta")
+logger.setLevel(logging.INFO)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(levelname)-9s %(message)s"))
+logger.addHandler(_log_handler)
+
+# Initialize LLM Service
+llm_service = LLMService()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm_service.start()
+    if await llm_service.check_ollama():
+        models = await llm_service.get_available_models()
+        logger.info("✅ Ollama is running! Available models: %s", ", ".join(models))
+    else:
+        logger.warning(
+            "⚠️ Ollama not detected. Run in another window: ollama serve "
+            "(or install: https://ollama.ai/)"
+        )
+    yield
+    await llm_service.aclose()
 
 app = FastAPI(
     title="Concepta API",
     description="Local AI Study Buddy Backend with Phi-3 Mini",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS properly
@@ -23,184 +55,355 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize LLM Service
-class LLMService:
-    def __init__(self, base_url: str = "http://localhost:11434"):
-        self.base_url = base_url
-        self.available_models = ["phi3:mini", "llama3.2:3b", "mistral:7b", "llama3.1:8b"]
-    
-    def check_ollama(self) -> bool:
-        """Check if Ollama is running."""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=3)
-            return response.status_code == 200
-        except:
-            return False
-    
-    def get_available_models(self) -> List[str]:
-        """Get list of available models from Ollama."""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models_data = response.json()
-                installed = [model["name"] for model in models_data.get("models", [])]
-                return installed if installed else self.available_models
-        except Exception as e:
-            print(f"Ollama connection error: {e}")
-        return self.available_models
-    
-    def generate_response(self, prompt: str, model: str = "phi3:mini") -> str:
-        """Generate response from Ollama with fallback."""
-        print(f"\n📤 Sending to {model}: {prompt[:100]}...")
-        
-        # Check if Ollama is running
-        if not self.check_ollama():
-            print("⚠️ Ollama not running, using mock response")
-            return self._generate_mock_response(prompt, model)
-        
-        try:
-            # Optimize for Phi-3
-            options = {
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 40,
-                "num_predict": 1024
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": options
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                response_text = result.get("response", "").strip()
-                print(f"✅ Received {len(response_text)} chars")
-                return response_text
-            else:
-                print(f"❌ Ollama error {response.status_code}")
-                return self._generate_mock_response(prompt, model)
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Connection failed: {e}")
-            return self._generate_mock_response(prompt, model)
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return self._generate_mock_response(prompt, model)
-    
-    def _generate_mock_response(self, prompt: str, model: str) -> str:
-        """Generate mock responses for testing."""
-        time.sleep(0.5)  # Simulate delay
-        
-        if "explain" in prompt.lower():
-            return """SIMPLE EXPLANATION:
-This concept helps organize information and solve problems systematically.
+# Request Models
+class ExplainRequest(BaseModel):
+    topic: str
+    difficulty: str = "beginner"
+    model: str = "phi3:mini"
+
+class SummarizeRequest(BaseModel):
+    notes: str
+    length: str = "medium"
+    model: str = "phi3:mini"
+
+class QuizRequest(BaseModel):
+    content: str
+    type: str = "mixed"
+    difficulty: str = "medium"
+    count: int = 3
+    model: str = "phi3:mini"
+
+class FlashcardsRequest(BaseModel):
+    content: str
+    count: int = 5
+    model: str = "phi3:mini"
+
+# ===== PROMPTS & PARSERS =====
+
+# Fixed instructions go in Ollama's system field ahead of the user input, so
+# every request of a kind shares the same prefix and Ollama can reuse its KV cache.
+EXPLAIN_SYSTEM_PROMPT = """Explain the given topic for a student at the given level.
+
+Please provide in this exact format:
+
+SIMPLE EXPLANATION:
+[2-3 sentences, very simple]
 
 STEPS:
-1. Understand the basic definition
-2. Learn the key components
-3. Practice with examples
-4. Apply in real situations
+1. [First step - concise]
+2. [Second step - concise]
+3. [Third step - concise]
 
 ANALOGY:
-Like learning to cook - start with ingredients, follow recipes, then create your own dishes.
+[One simple real-world comparison]
 
 KEY POINTS:
-- Focus on core principles
-- Practice regularly
-- Connect to real-world applications"""
-        
-        elif "summarize" in prompt.lower():
-            return """SUMMARY:
-The content covers essential concepts with practical applications for effective learning.
+- [Most important point]
+- [Second important point]
+- [Third important point]
+
+Use simple language and avoid technical jargon."""
+
+SUMMARIZE_SYSTEM_PROMPT = """Summarize the given notes concisely.
+
+Provide in this exact format:
+
+SUMMARY:
+[2-3 sentence overview]
 
 KEY POINTS:
-- Core concepts are explained clearly
-- Examples help understanding
-- Practice exercises reinforce learning
+- [Point 1]
+- [Point 2]
+- [Point 3]
 
 DEFINITIONS:
-Concept: A fundamental idea or principle
-Application: How concepts are used in practice
+[Term1]: [Simple definition]
+[Term2]: [Simple definition]
 
 EXAM TIPS:
-- Review key definitions
-- Practice with examples
-- Understand concepts rather than memorize"""
-        
-        elif "quiz" in prompt.lower():
-            return """[
+- [Tip 1]
+- [Tip 2]
+
+Keep it concise and focused on essentials."""
+
+QUIZ_SYSTEM_PROMPT = """Create quiz questions about the given content.
+
+Format as JSON array with exactly these fields for each question:
+- question: string
+- type: "mcq" or "truefalse" or "short"
+- options: array of strings (only for MCQ)
+- answer: string
+- explanation: string
+
+Example format:
+[
   {
-    "question": "What is the main purpose of studying this concept?",
+    "question": "What is...?",
     "type": "mcq",
-    "options": ["To memorize facts", "To develop problem-solving skills", "To pass exams only", "To complicate simple ideas"],
-    "answer": "To develop problem-solving skills",
-    "explanation": "The concept helps build critical thinking and problem-solving abilities."
-  },
-  {
-    "question": "True or False: This concept has practical applications.",
-    "type": "truefalse",
-    "answer": "True",
-    "explanation": "The concept can be applied to solve real-world problems."
+    "options": ["A", "B", "C", "D"],
+    "answer": "B",
+    "explanation": "Because..."
   }
-]"""
-        
-        elif "flashcard" in prompt.lower():
-            return """[
-  {
-    "question": "What is the definition of the core concept?",
-    "answer": "A fundamental idea that forms the basis for understanding a subject."
-  },
+]
+
+Create the requested number of diverse questions."""
+
+FLASHCARDS_SYSTEM_PROMPT = """Create flashcards about the given content.
+
+Format as JSON array with question and answer pairs:
+[
   {
-    "question": "Name one application of this concept.",
-    "answer": "It can be used to solve problems systematically."
+    "question": "Clear question?",
+    "answer": "Concise answer"
   }
-]"""
-        
-        else:
-            return f"""Response from {model}:
+]
 
-I understand you're looking for information on this topic. Here are key insights:
+Create the requested number of focused flashcards."""
 
-1. **Main Idea**: The concept revolves around understanding fundamental principles
-2. **Applications**: Can be used in various practical scenarios
-3. **Importance**: Provides foundation for advanced learning
+# The variable part of each prompt, always after the fixed system prompt
+EXPLAIN_PROMPT_TMPL = """Topic: "{topic}"
+Level: {difficulty}"""
 
-For best results with Phi-3 Mini:
-- Keep questions specific and concise
-- Focus on one concept at a time
-- Use clear, simple language"""
+SUMMARIZE_PROMPT_TMPL = """Notes:
 
-llm_service = LLMService()
+{notes}"""
 
-# Request Models
-class ExplainRequest(BaseModel):
-    topic: str
-    difficulty: str = "beginner"
-    model: str = "phi3:mini"
+QUIZ_PROMPT_TMPL = """Number of questions: {count}
 
-class SummarizeRequest(BaseModel):
-    notes: str
-    length: str = "medium"
-    model: str = "phi3:mini"
+Content:
 
-class QuizRequest(BaseModel):
-    content: str
-    type: str = "mixed"
-    difficulty: str = "medium"
-    count: int = 3
-    model: str = "phi3:mini"
+{content}"""
 
-class FlashcardsRequest(BaseModel):
-    content: str
-    count: int = 5
-    model: str = "phi3:mini"
+FLASHCARDS_PROMPT_TMPL = """Number of flashcards: {count}
+
+Content:
+
+{content}"""
+
+# Static defaults for when the model's answer is missing a section
+EXPLAIN_FALLBACK = {
+    "steps": ("Learn the basics", "Understand components", "Practice applications"),
+    "key_points": ("Focus on fundamentals", "Practice regularly", "Apply in real situations")
+}
+
+SUMMARY_FALLBACK = {
+    "key_points": ("Main concept", "Important detail", "Key application"),
+    "definitions": (
+        {"term": "Concept", "definition": "Fundamental idea"},
+        {"term": "Application", "definition": "Practical use"}
+    ),
+    "exam_tips": ("Review regularly", "Practice problems", "Understand concepts")
+}
+
+QUIZ_FALLBACK_QUESTION = {
+    "question": "True or False: This topic is important to understand.",
+    "type": "truefalse",
+    "answer": "True",
+    "explanation": "Understanding this topic is fundamental."
+}
+
+FLASHCARDS_FALLBACK_CARD = {
+    "question": "Why is this topic important?",
+    "answer": "It helps understand fundamental principles."
+}
+
+# A section header on its own line, optionally in markdown, e.g. "**KEY POINTS:**".
+# Text after the colon belongs to the section.
+EXPLAIN_HEADER_RE = re.compile(
+    r"^[ \t#*]*(?P<name>SIMPLE EXPLANATION|STEPS|ANALOGY|KEY POINTS)[ \t*]*(?::[ \t*]*|$)",
+    re.IGNORECASE | re.MULTILINE
+)
+SUMMARY_HEADER_RE = re.compile(
+    r"^[ \t#*]*(?P<name>SUMMARY|KEY POINTS|DEFINITIONS|EXAM TIPS)[ \t*]*(?::[ \t*]*|$)",
+    re.IGNORECASE | re.MULTILINE
+)
+# Numbered or bulleted list items, and bulleted items only
+ITEM_RE = re.compile(r"^[ \t]*(?:\d+[.)]|[-*•])[ \t]*(\S.*?)[ \t]*$", re.MULTILINE)
+BULLET_RE = re.compile(r"^[ \t]*[-*•][ \t]*(\S.*?)[ \t]*$", re.MULTILINE)
+# "Term: definition" lines
+DEFINITION_RE = re.compile(r"^[ \t]*([^:\n]*?)[ \t]*:[ \t]*(.*?)[ \t]*$", re.MULTILINE)
+FIRST_LINE_RE = re.compile(r"\S[^\n]*")
+
+def split_sections(response: str, header_re: re.Pattern) -> Dict[str, str]:
+    """Map each section header to the text up to the next header."""
+    sections: Dict[str, str] = {}
+    matches = list(header_re.finditer(response))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(response)
+        sections.setdefault(match.group("name").upper(), response[match.end():end])
+    return sections
+
+def first_line(text: str) -> str:
+    """Return the first non-blank line of text, stripped."""
+    match = FIRST_LINE_RE.search(text)
+    return match.group().strip() if match else ""
+
+def extract_json_array(text: str) -> Optional[List[Any]]:
+    """Return the first JSON array of objects in a model response.
+
+    Models often wrap the array in prose, so candidates are found in a single
+    pass that keeps a stack of open brackets, ignoring brackets inside strings.
+    Unclosed or stray brackets in the prose never cause a rescan.
+    """
+    try:
+        data = orjson.loads(text)
+        if isinstance(data, list):
+            return data
+    except orjson.JSONDecodeError:
+        pass
+
+    found = None
+    starts: List[int] = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"' and starts:
+            in_string = True
+        elif char == "[":
+            starts.append(i)
+        elif char == "]" and starts:
+            start = starts.pop()
+            # An enclosing array wins over one found inside it
+            if found is None or start < found[0]:
+                try:
+                    data = orjson.loads(text[start:i + 1])
+                    if isinstance(data, list) and any(isinstance(item, dict) for item in data):
+                        found = (start, data)
+                except orjson.JSONDecodeError:
+                    pass
+            if found is not None and not starts:
+                return found[1]
+    return found[1] if found is not None else None
+
+def parse_explanation(response: str, topic: str, difficulty: str) -> Dict[str, Any]:
+    """Parse an explanation into sections, filling gaps with defaults."""
+    sections = split_sections(response, EXPLAIN_HEADER_RE)
+    result = {
+        "topic": topic,
+        "difficulty": difficulty,
+        "simple_explanation": first_line(sections.get("SIMPLE EXPLANATION", "")),
+        "steps": ITEM_RE.findall(sections.get("STEPS", ""))[:5],
+        "analogy": first_line(sections.get("ANALOGY", "")),
+        "key_points": BULLET_RE.findall(sections.get("KEY POINTS", ""))[:5]
+    }
+    
+    # Ensure we have data
+    if not result["simple_explanation"]:
+        result["simple_explanation"] = f"Explanation of {topic} at {difficulty} level."
+    if not result["steps"]:
+        result["steps"] = EXPLAIN_FALLBACK["steps"]
+    if not result["analogy"]:
+        result["analogy"] = f"Understanding {topic} is like learning any new skill - start simple, practice, master."
+    if not result["key_points"]:
+        result["key_points"] = EXPLAIN_FALLBACK["key_points"]
+    
+    return result
+
+def parse_summary(response: str, length: str) -> Dict[str, Any]:
+    """Parse a summary into sections, filling gaps with defaults."""
+    sections = split_sections(response, SUMMARY_HEADER_RE)
+    result = {
+        "length": length,
+        "summary": first_line(sections.get("SUMMARY", "")),
+        "key_points": BULLET_RE.findall(sections.get("KEY POINTS", "")),
+        "definitions": [
+            {"term": term, "definition": definition}
+            for term, definition in DEFINITION_RE.findall(sections.get("DEFINITIONS", ""))
+        ],
+        "exam_tips": BULLET_RE.findall(sections.get("EXAM TIPS", ""))
+    }
+    
+    # Ensure data
+    if not result["summary"]:
+        result["summary"] = f"Summary of notes for {length} review."
+    if not result["key_points"]:
+        result["key_points"] = SUMMARY_FALLBACK["key_points"]
+    if not result["definitions"]:
+        result["definitions"] = SUMMARY_FALLBACK["definitions"]
+    if not result["exam_tips"]:
+        result["exam_tips"] = SUMMARY_FALLBACK["exam_tips"]
+    
+    return result
+
+# Header names matched by the section regexes, mapped to result keys
+EXPLAIN_SECTIONS = {
+    "SIMPLE EXPLANATION": "simple_explanation",
+    "STEPS": "steps",
+    "ANALOGY": "analogy",
+    "KEY POINTS": "key_points"
+}
+SUMMARY_SECTIONS = {
+    "SUMMARY": "summary",
+    "KEY POINTS": "key_points",
+    "DEFINITIONS": "definitions",
+    "EXAM TIPS": "exam_tips"
+}
+LINE_RE = re.compile(r"[^\n]+")
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+async def stream_sections(
+    tokens: AsyncIterator[str],
+    header_re: re.Pattern,
+    sections: Mapping[str, str],
+    finalize: Callable[[str], Dict[str, Any]]
+) -> AsyncIterator[str]:
+    """Relay tokens as SSE events, emitting each section once it is complete.
+
+    Ends with a "done" event carrying the fully parsed result.
+    """
+    parts = []
+    pending = ""
+    current_section = None
+    section_lines: List[str] = []
+
+    def handle_line(line: str) -> Optional[str]:
+        nonlocal current_section, section_lines
+        event = None
+        header = header_re.match(line)
+        if header:
+            if current_section:
+                event = sse_event("section", {"name": current_section, "content": "\n".join(section_lines)})
+            current_section = sections[header.group("name").upper()]
+            section_lines = []
+            line = line[header.end():]
+        line = line.strip()
+        if line and current_section:
+            section_lines.append(line)
+        return event
+
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield sse_event("token", {"text": token})
+            pending += token
+            # Only complete lines can be classified; keep the tail for the next token
+            cut = pending.rfind("\n")
+            if cut == -1:
+                continue
+            for match in LINE_RE.finditer(pending, 0, cut):
+                event = handle_line(match.group())
+                if event:
+                    yield event
+            pending = pending[cut + 1:]
+
+        event = handle_line(pending)
+        if event:
+            yield event
+        if current_section:
+            yield sse_event("section", {"name": current_section, "content": "\n".join(section_lines)})
+        yield sse_event("done", finalize("".join(parts)))
+    except Exception as e:
+        logger.error("Error while streaming: %s", e)
+        yield sse_event("error", {"detail": str(e)})
 
 # ===== API ENDPOINTS =====
 
@@ -215,7 +418,9 @@ async def root():
             "GET /models",
             "GET /model-info",
             "POST /explain",
+            "POST /explain/stream",
             "POST /summarize",
+            "POST /summarize/stream",
             "POST /quiz",
             "POST /flashcards"
         ],
@@ -224,7 +429,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    ollama_status = llm_service.check_ollama()
+    ollama_status = await llm_service.check_ollama()
     return {
         "status": "healthy",
         "service": "Concepta API",
@@ -234,14 +439,14 @@ async def health_check():
 
 @app.get("/models")
 async def get_models():
-    models = llm_service.get_available_models()
+    models = await llm_service.get_available_models()
     return {"models": models}
 
 @app.get("/model-info")
 async def get_model_info():
     return {
         "current_model": "phi3:mini",
-        "available_models": llm_service.get_available_models(),
+        "available_models": await llm_service.get_available_models(),
         "optimized_for": "phi3:mini",
         "specs": {
             "phi3:mini": "3.8B parameters, ~4GB RAM",
@@ -249,7 +454,7 @@ async def get_model_info():
             "mistral:7b": "7B parameters, ~7GB RAM",
             "llama3.1:8b": "8B parameters, ~8GB RAM"
         },
-        "ollama_running": llm_service.check_ollama()
+        "ollama_running": await llm_service.check_ollama()
     }
 
 @app.post("/explain")
@@ -257,188 +462,85 @@ async def explain_concept(request: ExplainRequest):
     try:
         # Limit input length for Phi-3
         topic = request.topic[:500]
+        prompt = EXPLAIN_PROMPT_TMPL.format(topic=topic, difficulty=request.difficulty)
         
-        prompt = f"""Explain "{topic}" for a {request.difficulty} level student.
-
-Please provide in this exact format:
-
-SIMPLE EXPLANATION:
-[2-3 sentences, very simple]
-
-STEPS:
-1. [First step - concise]
-2. [Second step - concise]
-3. [Third step - concise]
-
-ANALOGY:
-[One simple real-world comparison]
-
-KEY POINTS:
-- [Most important point]
-- [Second important point]
-- [Third important point]
-
-Use simple language and avoid technical jargon."""
-        
-        response = llm_service.generate_response(prompt, request.model)
-        
-        # Parse response
-        result = {
-            "topic": topic,
-            "difficulty": request.difficulty,
-            "simple_explanation": "",
-            "steps": [],
-            "analogy": "",
-            "key_points": []
-        }
+        response = await llm_service.generate_response(
+            prompt,
+            request.model,
+            semantic_key=topic,
+            semantic_scope=f"explain|{request.difficulty}",
+            system=EXPLAIN_SYSTEM_PROMPT
+        )
         
-        lines = response.split('\n')
-        current_section = None
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Detect sections
-            if "SIMPLE EXPLANATION" in line.upper():
-                current_section = "explanation"
-            elif "STEPS" in line.upper():
-                current_section = "steps"
-            elif "ANALOGY" in line.upper():
-                current_section = "analogy"
-            elif "KEY POINTS" in line.upper():
-                current_section = "key_points"
-            elif current_section:
-                if current_section == "explanation" and not result["simple_explanation"]:
-                    result["simple_explanation"] = line
-                elif current_section == "steps":
-                    if line.startswith(('1.', '2.', '3.', '4.', '5.', '-', '*')):
-                        step = line.lstrip('12345.-* ').strip()
-                        if step and len(result["steps"]) < 5:
-                            result["steps"].append(step)
-                elif current_section == "analogy" and not result["analogy"]:
-                    result["analogy"] = line
-                elif current_section == "key_points":
-                    if line.startswith(('-', '*')):
-                        point = line.lstrip('-* ').strip()
-                        if point and len(result["key_points"]) < 5:
-                            result["key_points"].append(point)
-        
-        # Ensure we have data
-        if not result["simple_explanation"]:
-            result["simple_explanation"] = f"Explanation of {topic} at {request.difficulty} level."
-        if not result["steps"]:
-            result["steps"] = ["Learn the basics", "Understand components", "Practice applications"]
-        if not result["analogy"]:
-            result["analogy"] = f"Understanding {topic} is like learning any new skill - start simple, practice, master."
-        if not result["key_points"]:
-            result["key_points"] = ["Focus on fundamentals", "Practice regularly", "Apply in real situations"]
-        
-        return result
+        return parse_explanation(response, topic, request.difficulty)
         
     except Exception as e:
-        print(f"Error in explain endpoint: {e}")
+        logger.error("Error in explain endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/explain/stream")
+async def explain_concept_stream(request: ExplainRequest):
+    topic = request.topic[:500]
+    prompt = EXPLAIN_PROMPT_TMPL.format(topic=topic, difficulty=request.difficulty)
+    tokens = llm_service.generate_stream(
+        prompt,
+        request.model,
+        semantic_key=topic,
+        semantic_scope=f"explain|{request.difficulty}",
+        system=EXPLAIN_SYSTEM_PROMPT
+    )
+    return StreamingResponse(
+        stream_sections(
+            tokens,
+            EXPLAIN_HEADER_RE,
+            EXPLAIN_SECTIONS,
+            lambda response: parse_explanation(response, topic, request.difficulty)
+        ),
+        media_type="text/event-stream"
+    )
+
 @app.post("/summarize")
 async def summarize_notes(request: SummarizeRequest):
     try:
         # Limit input for Phi-3
         notes = request.notes[:2000]
+        prompt = SUMMARIZE_PROMPT_TMPL.format(notes=notes)
         
-        prompt = f"""Summarize these notes concisely:
-
-{notes}
-
-Provide in this exact format:
-
-SUMMARY:
-[2-3 sentence overview]
-
-KEY POINTS:
-- [Point 1]
-- [Point 2]
-- [Point 3]
-
-DEFINITIONS:
-[Term1]: [Simple definition]
-[Term2]: [Simple definition]
-
-EXAM TIPS:
-- [Tip 1]
-- [Tip 2]
-
-Keep it concise and focused on essentials."""
-        
-        response = llm_service.generate_response(prompt, request.model)
+        response = await llm_service.generate_response(
+            prompt,
+            request.model,
+            semantic_key=notes,
+            semantic_scope=f"summarize|{request.length}",
+            system=SUMMARIZE_SYSTEM_PROMPT
+        )
         
-        # Parse response
-        result = {
-            "length": request.length,
-            "summary": "",
-            "key_points": [],
-            "definitions": [],
-            "exam_tips": []
-        }
-        
-        lines = response.split('\n')
-        current_section = None
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            if "SUMMARY" in line.upper():
-                current_section = "summary"
-            elif "KEY POINTS" in line.upper():
-                current_section = "key_points"
-            elif "DEFINITIONS" in line.upper():
-                current_section = "definitions"
-            elif "EXAM TIPS" in line.upper():
-                current_section = "exam_tips"
-            elif current_section:
-                if current_section == "summary" and not result["summary"]:
-                    result["summary"] = line
-                elif current_section == "key_points":
-                    if line.startswith(('-', '*')):
-                        point = line.lstrip('-* ').strip()
-                        if point:
-                            result["key_points"].append(point)
-                elif current_section == "definitions":
-                    if ':' in line:
-                        parts = line.split(':', 1)
-                        if len(parts) == 2:
-                            result["definitions"].append({
-                                "term": parts[0].strip(),
-                                "definition": parts[1].strip()
-                            })
-                elif current_section == "exam_tips":
-                    if line.startswith(('-', '*')):
-                        tip = line.lstrip('-* ').strip()
-                        if tip:
-                            result["exam_tips"].append(tip)
-        
-        # Ensure data
-        if not result["summary"]:
-            result["summary"] = f"Summary of notes for {request.length} review."
-        if not result["key_points"]:
-            result["key_points"] = ["Main concept", "Important detail", "Key application"]
-        if not result["definitions"]:
-            result["definitions"] = [
-                {"term": "Concept", "definition": "Fundamental idea"},
-                {"term": "Application", "definition": "Practical use"}
-            ]
-        if not result["exam_tips"]:
-            result["exam_tips"] = ["Review regularly", "Practice problems", "Understand concepts"]
-        
-        return result
+        return parse_summary(response, request.length)
         
     except Exception as e:
-        print(f"Error in summarize endpoint: {e}")
+        logger.error("Error in summarize endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/summarize/stream")
+async def summarize_notes_stream(request: SummarizeRequest):
+    notes = request.notes[:2000]
+    prompt = SUMMARIZE_PROMPT_TMPL.format(notes=notes)
+    tokens = llm_service.generate_stream(
+        prompt,
+        request.model,
+        semantic_key=notes,
+        semantic_scope=f"summarize|{request.length}",
+        system=SUMMARIZE_SYSTEM_PROMPT
+    )
+    return StreamingResponse(
+        stream_sections(
+            tokens,
+            SUMMARY_HEADER_RE,
+            SUMMARY_SECTIONS,
+            lambda response: parse_summary(response, request.length)
+        ),
+        media_type="text/event-stream"
+    )
+
 @app.post("/quiz")
 async def generate_quiz(request: QuizRequest):
     try:
@@ -446,46 +548,26 @@ async def generate_quiz(request: QuizRequest):
         content = request.content[:1000]
         count = min(request.count, 5)  # Max 5 for Phi-3
         
-        prompt = f"""Create {count} quiz questions about this content:
-
-{content}
-
-Format as JSON array with exactly these fields for each question:
-- question: string
-- type: "mcq" or "truefalse" or "short"
-- options: array of strings (only for MCQ)
-- answer: string
-- explanation: string
-
-Example format:
-[
-  {{
-    "question": "What is...?",
-    "type": "mcq",
-    "options": ["A", "B", "C", "D"],
-    "answer": "B",
-    "explanation": "Because..."
-  }}
-]
-
-Create {count} diverse questions."""
+        prompt = QUIZ_PROMPT_TMPL.format(count=count, content=content)
         
-        response = llm_service.generate_response(prompt, request.model)
+        response = await llm_service.generate_response(
+            prompt,
+            request.model,
+            semantic_key=content,
+            semantic_scope=f"quiz|{request.type}|{request.difficulty}|{count}",
+            system=QUIZ_SYSTEM_PROMPT
+        )
         
         # Try to extract JSON
         try:
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                questions = json.loads(json_match.group())
-                # Validate and clean
-                valid_questions = []
-                for q in questions:
-                    if isinstance(q, dict) and "question" in q and "answer" in q:
-                        if "type" not in q:
-                            q["type"] = "short"
-                        if "explanation" not in q:
-                            q["explanation"] = "Explanation not provided."
-                        valid_questions.append(q)
+            questions = extract_json_array(response)
+            if questions:
+                # Validate and fill in optional fields
+                valid_questions = [
+                    {"type": "short", "explanation": "Explanation not provided.", **q}
+                    for q in questions
+                    if isinstance(q, dict) and "question" in q and "answer" in q
+                ]
                 
                 if valid_questions:
                     return {
@@ -508,17 +590,12 @@ Create {count} diverse questions."""
                     "answer": "Option B",
                     "explanation": "This is correct based on the content."
                 },
-                {
-                    "question": "True or False: This topic is important to understand.",
-                    "type": "truefalse",
-                    "answer": "True",
-                    "explanation": "Understanding this topic is fundamental."
-                }
+                QUIZ_FALLBACK_QUESTION
             ]
         }
         
     except Exception as e:
-        print(f"Error in quiz endpoint: {e}")
+        logger.error("Error in quiz endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/flashcards")
@@ -528,35 +605,26 @@ async def generate_flashcards(request: FlashcardsRequest):
         content = request.content[:800]
         count = min(request.count, 8)  # Max 8 for Phi-3
         
-        prompt = f"""Create {count} flashcards about:
-
-{content}
-
-Format as JSON array with question and answer pairs:
-[
-  {{
-    "question": "Clear question?",
-    "answer": "Concise answer"
-  }}
-]
-
-Create {count} focused flashcards."""
+        prompt = FLASHCARDS_PROMPT_TMPL.format(count=count, content=content)
         
-        response = llm_service.generate_response(prompt, request.model)
+        response = await llm_service.generate_response(
+            prompt,
+            request.model,
+            semantic_key=content,
+            semantic_scope=f"flashcards|{count}",
+            system=FLASHCARDS_SYSTEM_PROMPT
+        )
         
         # Try to extract JSON
         try:
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                flashcards = json.loads(json_match.group())
+            flashcards = extract_json_array(response)
+            if flashcards:
                 # Validate
-                valid_flashcards = []
-                for card in flashcards:
-                    if isinstance(card, dict) and "question" in card and "answer" in card:
-                        valid_flashcards.append({
-                            "question": card["question"],
-                            "answer": card["answer"]
-                        })
+                valid_flashcards = [
+                    {"question": card["question"], "answer": card["answer"]}
+                    for card in flashcards
+                    if isinstance(card, dict) and "question" in card and "answer" in card
+                ]
                 
                 if valid_flashcards:
                     return {"flashcards": valid_flashcards[:count]}
@@ -570,41 +638,34 @@ Create {count} focused flashcards."""
                     "question": f"What is {content[:30]}...?",
                     "answer": "Important concept or definition."
                 },
-                {
-                    "question": "Why is this topic important?",
-                    "answer": "It helps understand fundamental principles."
-                }
+                FLASHCARDS_FALLBACK_CARD
             ]
         }
         
     except Exception as e:
-        print(f"Error in flashcards endpoint: {e}")
+        logger.error("Error in flashcards endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    print("=" * 50)
-    print("🚀 Starting Concepta Backend Server")
-    print("=" * 50)
-    print("API URL: http://localhost:8000")
-    print("Frontend: http://localhost:3000")
-    print("Health check: http://localhost:8000/health")
-    print("\n📊 Checking Ollama status...")
-    
-    if llm_service.check_ollama():
-        print("✅ Ollama is running!")
-        models = llm_service.get_available_models()
-        print(f"📚 Available models: {', '.join(models)}")
-    else:
-        print("⚠️ Ollama not detected")
-        print("   Run in another window: ollama serve")
-        print("   Or install: https://ollama.ai/")
-    
-    print("\n✅ Backend ready! Press CTRL+C to stop")
-    print("=" * 50)
+    # The banner is only useful when someone is watching the terminal
+    if sys.stdout.isatty():
+        print("=" * 50)
+        print("🚀 Starting Concepta Backend Server")
+        print("=" * 50)
+        print("API URL: http://localhost:8000")
+        print("Frontend: http://localhost:3000")
+        print("Health check: http://localhost:8000/health")
+        print("\n✅ Backend ready! Press CTRL+C to stop")
+        print("=" * 50)
     
+    # Workers are separate processes, so uvicorn needs the import string rather
+    # than the app object. Each worker keeps its own in-memory caches.
+    # uvicorn picks uvloop and httptools automatically when they are installed.
     uvicorn.run(
-        app,
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
         host="0.0.0.0",
         port=8000,
+        workers=min(4, os.cpu_count() or 1),
         log_level="info"
     )
\ No newline at end of file
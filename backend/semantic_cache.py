@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import orjson
+from batching import RequestBatcher
+
+logger = logging.getLogger("concepta")
+
+# Request bodies are encoded with orjson rather than httpx's stdlib json
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+DEFAULT_DB_PATH = os.environ.get(
+    "SEMANTIC_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantic_cache.db")
+)
+
+
+class _ScopeIndex:
+    """Embeddings and responses for one scope, capped at max_entries.
+
+    The matrix grows by doubling up to max_entries, then wraps around and
+    overwrites the oldest entry, so adding never copies the whole matrix
+    once it is full.
+    """
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        capacity = min(16, max_entries)
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.created = np.empty(capacity, dtype=np.float64)
+        self.responses: List[str] = []
+        self.size = 0
+        self._next = 0
+
+    def add(self, vector: np.ndarray, response_text: str, created: float) -> None:
+        if self.size == len(self.matrix) and self.size < self.max_entries:
+            capacity = min(2 * len(self.matrix), self.max_entries)
+            matrix = np.empty((capacity, self.matrix.shape[1]), dtype=np.float32)
+            matrix[:self.size] = self.matrix
+            timestamps = np.empty(capacity, dtype=np.float64)
+            timestamps[:self.size] = self.created
+            self.matrix, self.created = matrix, timestamps
+
+        i = self._next
+        self.matrix[i] = vector
+        self.created[i] = created
+        if i < len(self.responses):
+            self.responses[i] = response_text
+        else:
+            self.responses.append(response_text)
+        self._next = (i + 1) % self.max_entries
+        self.size = min(self.size + 1, self.max_entries)
+
+    def best_match(self, vector: np.ndarray, min_created: float) -> Tuple[float, int]:
+        """Return the highest similarity among unexpired entries and its index."""
+        similarities = self.matrix[:self.size] @ vector
+        similarities[self.created[:self.size] < min_created] = -np.inf
+        best = int(np.argmax(similarities))
+        return float(similarities[best]), best
+
+
+class SemanticCache:
+    """Cache LLM responses by embedding similarity of the user input.
+
+    Entries are grouped by scope (model, endpoint and request options) so only
+    the free-text part of a request is compared. Embeddings come from Ollama
+    and entries are persisted to SQLite.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        embedding_model: str = "nomic-embed-text",
+        similarity_threshold: float = 0.9,
+        db_path: str = DEFAULT_DB_PATH,
+        max_entries: int = 1000,
+        ttl: float = 24 * 60 * 60,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.base_url = base_url
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        # Per-scope size cap and entry lifetime, matching the exact-match cache's TTL
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = True
+        # Share the caller's connection pool when given one
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(base_url=base_url)
+        # Concurrent lookups share one /api/embed call
+        self.batcher = RequestBatcher(self._embed_batch)
+        self._scopes: Dict[str, _ScopeIndex] = {}
+
+        # Writes run in worker threads; the lock keeps them off the connection at once
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_scope ON entries (scope, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+        self._db.commit()
+        self._load()
+
+    def _load(self) -> None:
+        """Rebuild the in-memory index from the SQLite store, dropping stale rows."""
+        self._prune(self._db.execute("SELECT DISTINCT scope FROM entries").fetchall())
+        rows = self._db.execute("SELECT scope, embedding, response, created FROM entries ORDER BY id")
+        for scope, blob, response_text, created in rows:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            index = self._scopes.get(scope)
+            if index is None:
+                index = self._scopes[scope] = _ScopeIndex(len(vector), self.max_entries)
+            index.add(vector, response_text, created)
+
+    def _prune(self, scopes: List[Tuple[str]]) -> None:
+        """Delete expired rows, and rows beyond max_entries in the given scopes."""
+        self._db.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+        self._db.executemany(
+            """DELETE FROM entries WHERE scope = ? AND id NOT IN (
+                SELECT id FROM entries WHERE scope = ? ORDER BY id DESC LIMIT ?
+            )""",
+            [(scope, scope, self.max_entries) for (scope,) in scopes]
+        )
+        self._db.commit()
+
+    async def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed texts in one Ollama call, returning an (N, D) matrix of unit vectors."""
+        if not self.enabled or not texts:
+            return None
+        try:
+            response = await self.client.post(
+                "/api/embed",
+                content=orjson.dumps({"model": self.embedding_model, "input": texts}),
+                headers=JSON_HEADERS,
+                timeout=10
+            )
+        except httpx.HTTPError:
+            return None
+
+        if response.status_code == 404:
+            # Embedding model not pulled - stop paying for the round-trip
+            logger.warning("⚠️ Semantic cache disabled: %s not found", self.embedding_model)
+            self.enabled = False
+            return None
+        if response.status_code != 200:
+            # e.g. 503 while Ollama loads the model; try again on the next request
+            logger.warning("Embedding request failed with status %s", response.status_code)
+            return None
+
+        matrix = np.asarray(orjson.loads(response.content).get("embeddings", []), dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(texts):
+            return None
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    async def _embed_batch(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        matrix = await self.embed(texts)
+        if matrix is None:
+            return [None] * len(texts)
+        return list(matrix)
+
+    async def embed_one(self, text: str) -> Optional[np.ndarray]:
+        """Embed a single text, batched with other concurrent lookups."""
+        if not self.enabled:
+            return None
+        return await self.batcher.submit(text)
+
+    def _scope_key(self, scope: str) -> str:
+        # Vectors from different embedding models are not comparable
+        return f"{self.embedding_model}|{scope}"
+
+    def check(self, vector: np.ndarray, scope: str) -> Optional[str]:
+        """Return the closest cached response in scope if it is similar enough."""
+        index = self._scopes.get(self._scope_key(scope))
+        if index is None:
+            return None
+        similarity, best = index.best_match(vector, time.time() - self.ttl)
+        if similarity >= self.similarity_threshold:
+            return index.responses[best]
+        return None
+
+    async def store(self, prompt: str, response_text: str, vector: np.ndarray, scope: str) -> None:
+        """Add a response to the cache and persist it without blocking the event loop."""
+        scope = self._scope_key(scope)
+        created = time.time()
+        index = self._scopes.get(scope)
+        if index is None:
+            index = self._scopes[scope] = _ScopeIndex(len(vector), self.max_entries)
+        index.add(vector, response_text, created)
+
+        try:
+            await asyncio.to_thread(self._persist, scope, prompt, response_text, vector.tobytes(), created)
+        except sqlite3.Error as e:
+            # e.g. "database is locked" with several workers; the answer itself is still good
+            logger.warning("Semantic cache write failed: %s", e)
+
+    def _persist(self, scope: str, prompt: str, response_text: str, blob: bytes, created: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO entries (scope, prompt, embedding, response, created) VALUES (?, ?, ?, ?, ?)",
+                (scope, prompt, blob, response_text, created)
+            )
+            self._prune([(scope,)])
+
+    def clear(self) -> None:
+        """Drop all cached entries, in memory and on disk."""
+        self._scopes.clear()
+        with self._db_lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    async def aclose(self) -> None:
+        """Stop batching and close the pooled Ollama connections."""
+        await self.batcher.stop()
+        if self._owns_client:
+            await self.client.aclose()
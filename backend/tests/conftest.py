@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The backend modules import each other as top-level modules (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the default semantic cache (e.g. the one main creates on import) out of backend/
+os.environ.setdefault("SEMANTIC_CACHE_DB", os.path.join(tempfile.mkdtemp(), "semantic_cache.db"))
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from batching import RequestBatcher
+
+
+def test_splits_into_batches_of_max_batch():
+    batches = []
+
+    async def handler(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = RequestBatcher(handler, max_batch=8, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [i * 2 for i in range(10)]
+    assert [len(batch) for batch in batches] == [8, 2]
+
+
+def test_late_request_goes_into_next_batch():
+    batches = []
+
+    async def handler(items):
+        batches.append(list(items))
+        return items
+
+    async def run():
+        batcher = RequestBatcher(handler, max_wait=0.01)
+        first = await batcher.submit("a")
+        second = await batcher.submit("b")
+        await batcher.stop()
+        return first, second
+
+    assert asyncio.run(run()) == ("a", "b")
+    assert batches == [["a"], ["b"]]
+
+
+def test_exceptions_only_reach_their_own_caller():
+    async def handler(items):
+        return [ValueError(item) if item == 2 else item for item in items]
+
+    async def run():
+        batcher = RequestBatcher(handler, max_wait=0.01)
+        results = await asyncio.gather(
+            *(batcher.submit(i) for i in range(4)),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results[:2] == [0, 1]
+    assert isinstance(results[2], ValueError)
+    assert results[3] == 3
+
+
+def test_handler_failure_reaches_every_caller():
+    async def handler(items):
+        raise RuntimeError("Ollama down")
+
+    async def run():
+        batcher = RequestBatcher(handler, max_wait=0.01)
+        results = await asyncio.gather(
+            batcher.submit("a"),
+            batcher.submit("b"),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_caller_does_not_break_the_batch():
+    async def run():
+        release = asyncio.Event()
+
+        async def handler(items):
+            await release.wait()
+            return items
+
+        batcher = RequestBatcher(handler, max_wait=0.01)
+        cancelled = asyncio.create_task(batcher.submit("a"))
+        kept = asyncio.create_task(batcher.submit("b"))
+        # Let the collector hand both to the handler
+        await asyncio.sleep(0.05)
+        cancelled.cancel()
+        release.set()
+
+        assert await kept == "b"
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await batcher.stop()
+
+    asyncio.run(run())
+
+
+def test_slow_batch_does_not_hold_up_the_next():
+    async def run():
+        release = asyncio.Event()
+
+        async def handler(items):
+            if "slow" in items:
+                await release.wait()
+            return items
+
+        batcher = RequestBatcher(handler, max_wait=0.01)
+        slow = asyncio.create_task(batcher.submit("slow"))
+        await asyncio.sleep(0.05)
+        assert await asyncio.wait_for(batcher.submit("fast"), 1) == "fast"
+        release.set()
+        assert await slow == "slow"
+        await batcher.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,191 @@
+import asyncio
+import sqlite3
+
+import httpx
+import orjson
+import pytest
+
+from llm_service import LLMService, extract_response_field
+from semantic_cache import SemanticCache
+
+ANSWER = "REAL ANSWER"
+
+
+def ollama(request: httpx.Request) -> httpx.Response:
+    """Answer the Ollama endpoints LLMService uses."""
+    body = orjson.loads(request.content) if request.content else {}
+    if request.url.path == "/api/embed":
+        return httpx.Response(200, content=orjson.dumps({"embeddings": [[1.0, 0.0]] * len(body["input"])}))
+    if request.url.path == "/api/generate" and body.get("stream"):
+        lines = [{"response": "REAL ", "done": False}, {"response": "ANSWER", "done": True}]
+        return httpx.Response(200, content=b"\n".join(orjson.dumps(line) for line in lines))
+    if request.url.path == "/api/generate":
+        return httpx.Response(200, content=orjson.dumps({"response": ANSWER, "done": True, "context": [1, 2]}))
+    return httpx.Response(404)
+
+
+def make_service(tmp_path, handler=ollama) -> LLMService:
+    service = LLMService()
+    service.client = httpx.AsyncClient(base_url=service.base_url, transport=httpx.MockTransport(handler))
+    service.semantic_cache = SemanticCache(db_path=str(tmp_path / "cache.db"), client=service.client)
+    return service
+
+
+def run(service: LLMService, coro):
+    async def main():
+        service.start()
+        try:
+            return await coro
+        finally:
+            await service.aclose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def locked_db(monkeypatch):
+    def fail(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(SemanticCache, "_persist", fail)
+
+
+def test_cache_write_failure_keeps_generated_response(tmp_path, locked_db):
+    service = make_service(tmp_path)
+    response = run(service, service.generate_response("Explain gravity", semantic_key="gravity"))
+    assert response == ANSWER
+
+
+def test_cache_write_failure_keeps_streamed_response(tmp_path, locked_db):
+    service = make_service(tmp_path)
+
+    async def collect():
+        return [token async for token in service.generate_stream("Explain gravity", semantic_key="gravity")]
+
+    assert "".join(run(service, collect())) == ANSWER
+
+
+def test_exact_cache_evicts_least_recently_used(tmp_path):
+    service = make_service(tmp_path)
+    service.cache_size = 2
+    service._cache_put("a", "A")
+    service._cache_put("b", "B")
+    assert service._cache_get("a") == "A"
+    service._cache_put("c", "C")
+
+    assert service._cache_get("b") is None
+    assert list(service._response_cache) == ["a", "c"]
+
+
+def test_exact_cache_expires_entries(tmp_path, monkeypatch):
+    service = make_service(tmp_path)
+    service._cache_put("a", "A")
+    now = service._response_cache["a"][0]
+
+    monkeypatch.setattr("llm_service.time.time", lambda: now + service.cache_ttl + 1)
+    assert service._cache_get("a") is None
+    assert "a" not in service._response_cache
+
+
+def test_repeated_prompt_is_served_from_cache(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return ollama(request)
+
+    service = make_service(tmp_path, handler)
+
+    async def twice():
+        first = await service.generate_response("Explain gravity")
+        second = await service.generate_response("  explain   GRAVITY ")
+        return first, second
+
+    assert run(service, twice()) == (ANSWER, ANSWER)
+    assert calls == ["/api/generate"]
+
+
+def test_empty_response_is_not_cached(tmp_path):
+    def handler(request):
+        if request.url.path == "/api/generate":
+            return httpx.Response(200, content=orjson.dumps({"response": "", "done": True}))
+        return ollama(request)
+
+    service = make_service(tmp_path, handler)
+    assert run(service, service.generate_response("Explain gravity", semantic_key="gravity")) == ""
+    assert not service._response_cache
+    assert not service.semantic_cache._scopes
+
+
+def test_extract_response_field_unescapes_value():
+    text = 'He said "hi" \\ then\n"response": "nested"'
+    body = orjson.dumps({
+        "model": "phi3:mini",
+        "response": text,
+        "done": True,
+        "context": list(range(100))
+    })
+    assert extract_response_field(body) == text
+
+
+def test_extract_response_field_falls_back_to_full_decode():
+    assert extract_response_field(b'{"model": "m", "done": true}') == ""
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_service.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_status_is_cached_for_status_ttl(tmp_path, clock):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200)
+
+    service = make_service(tmp_path, handler)
+
+    async def poll():
+        results = [await service.check_ollama()]
+        clock[0] += service.status_ttl - 1
+        results.append(await service.check_ollama())
+        clock[0] += 2
+        results.append(await service.check_ollama())
+        return results
+
+    assert run(service, poll()) == [True, True, True]
+    assert calls == ["/", "/"]
+
+
+def test_installed_models_are_cached_for_tags_ttl(tmp_path, clock):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, content=orjson.dumps({"models": [{"name": "phi3:mini"}]}))
+
+    service = make_service(tmp_path, handler)
+
+    async def poll():
+        results = [await service.get_available_models()]
+        clock[0] += service.tags_ttl - 1
+        results.append(await service.get_available_models())
+        clock[0] += 2
+        results.append(await service.get_available_models())
+        return results
+
+    assert run(service, poll()) == [["phi3:mini"]] * 3
+    assert calls == ["/api/tags", "/api/tags"]
+
+
+def test_failed_model_list_is_not_cached(tmp_path, clock):
+    responses = [httpx.Response(500), httpx.Response(200, content=orjson.dumps({"models": [{"name": "phi3:mini"}]}))]
+    service = make_service(tmp_path, lambda request: responses.pop(0))
+
+    async def poll():
+        return [await service.get_available_models(), await service.get_available_models()]
+
+    assert run(service, poll()) == [service.available_models, ["phi3:mini"]]
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import orjson
+
+from main import (
+    EXPLAIN_HEADER_RE,
+    EXPLAIN_SECTIONS,
+    extract_json_array,
+    parse_explanation,
+    stream_sections,
+)
+
+EXPLANATION = """SIMPLE EXPLANATION: Plants turn light into food.
+
+**STEPS:**
+1. Leaves absorb light
+2. Water is split
+ANALOGY:
+Like a solar-powered kitchen.
+KEY POINTS:
+- Needs sunlight
+- Releases oxygen"""
+
+
+def collect_events(chunks):
+    async def tokens():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        stream = stream_sections(
+            tokens(),
+            EXPLAIN_HEADER_RE,
+            EXPLAIN_SECTIONS,
+            lambda response: parse_explanation(response, "photosynthesis", "beginner")
+        )
+        return [event async for event in stream]
+
+    events = []
+    for raw in asyncio.run(run()):
+        header, data = raw.strip().split("\n", 1)
+        events.append((header[len("event: "):], orjson.loads(data[len("data: "):])))
+    return events
+
+
+def test_stream_sections_handles_tokens_split_mid_line():
+    # Three-character chunks split headers, bullets and newlines apart
+    chunks = [EXPLANATION[i:i + 3] for i in range(0, len(EXPLANATION), 3)]
+    events = collect_events(chunks)
+
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert "".join(tokens) == EXPLANATION
+
+    sections = [(data["name"], data["content"]) for name, data in events if name == "section"]
+    assert sections == [
+        ("simple_explanation", "Plants turn light into food."),
+        ("steps", "1. Leaves absorb light\n2. Water is split"),
+        ("analogy", "Like a solar-powered kitchen."),
+        ("key_points", "- Needs sunlight\n- Releases oxygen"),
+    ]
+
+    name, result = events[-1]
+    assert name == "done"
+    assert result["steps"] == ["Leaves absorb light", "Water is split"]
+    assert result["key_points"] == ["Needs sunlight", "Releases oxygen"]
+
+
+def test_stream_sections_flushes_header_on_last_line():
+    events = collect_events(["STEPS:\n1. One\nANALOGY:"])
+    sections = [(data["name"], data["content"]) for name, data in events if name == "section"]
+    assert sections == [("steps", "1. One"), ("analogy", "")]
+
+
+def test_extract_json_array_ignores_brackets_inside_strings():
+    text = 'Here you go: [{"question": "What is ] or [?", "answer": "a \\"[\\" b"}] Done [x]'
+    assert extract_json_array(text) == [{"question": "What is ] or [?", "answer": 'a "[" b'}]
+
+
+def test_extract_json_array_skips_prose_brackets():
+    text = 'There are [3] cards, see below:\n[{"question": "q", "answer": "a"}]'
+    assert extract_json_array(text) == [{"question": "q", "answer": "a"}]
+
+
+def test_extract_json_array_continues_past_unclosed_bracket():
+    text = 'Answer format [see below:\n[{"question": "q", "answer": "a"}]'
+    assert extract_json_array(text) == [{"question": "q", "answer": "a"}]
+
+
+def test_extract_json_array_prefers_the_enclosing_array():
+    text = 'Cards: [{"question": "q", "options": [{"text": "a"}]}] end'
+    assert extract_json_array(text) == [{"question": "q", "options": [{"text": "a"}]}]
+
+
+def test_extract_json_array_without_array():
+    assert extract_json_array("no json here [ at all") is None
+
+
+def test_extract_json_array_is_linear_in_unclosed_brackets():
+    # A rescan from every unclosed bracket took seconds on input this size
+    text = "[" * 20000 + '[{"question": "q", "answer": "a"}]' + "]" * 3
+    started = time.perf_counter()
+    assert extract_json_array(text) == [{"question": "q", "answer": "a"}]
+    assert extract_json_array("[" * 20000) is None
+    assert time.perf_counter() - started < 0.5
@@ -0,0 +1,112 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from semantic_cache import SemanticCache, _ScopeIndex
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+def store_all(cache, entries):
+    async def run():
+        for prompt, vector, scope in entries:
+            await cache.store(prompt, prompt.upper(), vector, scope)
+
+    asyncio.run(run())
+
+
+def test_scope_index_grows_then_overwrites_oldest():
+    index = _ScopeIndex(dim=2, max_entries=20)
+    for i in range(25):
+        index.add(unit(1, i), f"r{i}", created=float(i))
+
+    assert index.size == 20
+    assert len(index.matrix) == 20
+    # Entries 0-4 were overwritten in place by 20-24
+    assert index.responses[:5] == ["r20", "r21", "r22", "r23", "r24"]
+    assert index.responses[5] == "r5"
+    similarity, best = index.best_match(unit(1, 22), min_created=0)
+    assert (best, index.responses[best]) == (2, "r22")
+    assert similarity > 0.99
+
+
+def test_scope_index_skips_expired_entries():
+    index = _ScopeIndex(dim=2, max_entries=4)
+    index.add(unit(1, 0), "old", created=10.0)
+    index.add(unit(0, 1), "new", created=20.0)
+
+    similarity, best = index.best_match(unit(1, 0), min_created=15.0)
+    assert index.responses[best] == "new"
+    assert similarity < 0.9
+
+
+def test_check_matches_within_scope_only(db_path):
+    cache = SemanticCache(db_path=db_path)
+    store_all(cache, [("gravity", unit(1, 0), "explain")])
+
+    assert cache.check(unit(1, 0.1), "explain") == "GRAVITY"
+    assert cache.check(unit(0, 1), "explain") is None
+    assert cache.check(unit(1, 0), "summarize") is None
+
+
+def test_check_ignores_expired_entries(db_path, monkeypatch):
+    cache = SemanticCache(db_path=db_path, ttl=60)
+    store_all(cache, [("gravity", unit(1, 0), "explain")])
+
+    now = cache._scopes[cache._scope_key("explain")].created[0]
+    monkeypatch.setattr("semantic_cache.time.time", lambda: now + 61)
+    assert cache.check(unit(1, 0), "explain") is None
+
+
+def test_entries_reload_from_disk(db_path):
+    store_all(SemanticCache(db_path=db_path), [
+        ("gravity", unit(1, 0), "explain"),
+        ("orbits", unit(0, 1), "explain"),
+    ])
+
+    reloaded = SemanticCache(db_path=db_path)
+    assert reloaded.check(unit(1, 0), "explain") == "GRAVITY"
+    assert reloaded.check(unit(0, 1), "explain") == "ORBITS"
+
+
+def test_store_keeps_only_newest_rows_per_scope(db_path):
+    cache = SemanticCache(db_path=db_path, max_entries=2)
+    store_all(cache, [(f"p{i}", unit(1, i), "explain") for i in range(3)] + [("q", unit(0, 1), "quiz")])
+
+    rows = cache._db.execute("SELECT prompt FROM entries ORDER BY id").fetchall()
+    assert rows == [("p1",), ("p2",), ("q",)]
+
+
+def test_load_drops_expired_and_excess_rows(db_path, monkeypatch):
+    store_all(SemanticCache(db_path=db_path), [(f"p{i}", unit(1, i), "explain") for i in range(3)])
+
+    reloaded = SemanticCache(db_path=db_path, max_entries=2)
+    assert reloaded._scopes[reloaded._scope_key("explain")].responses == ["P1", "P2"]
+
+    later = reloaded._db.execute("SELECT MAX(created) FROM entries").fetchone()[0] + 25 * 60 * 60
+    monkeypatch.setattr("semantic_cache.time.time", lambda: later)
+    expired = SemanticCache(db_path=db_path)
+    assert not expired._scopes
+    assert expired._db.execute("SELECT COUNT(*) FROM entries").fetchone() == (0,)
+
+
+@pytest.mark.parametrize("status, enabled", [(404, False), (503, True)])
+def test_only_missing_model_disables_cache(db_path, status, enabled):
+    client = httpx.AsyncClient(
+        base_url="http://ollama",
+        transport=httpx.MockTransport(lambda request: httpx.Response(status))
+    )
+    cache = SemanticCache(db_path=db_path, client=client)
+
+    assert asyncio.run(cache.embed(["gravity"])) is None
+    assert cache.enabled is enabled